@@ -0,0 +1,7 @@
+import time
+
+_T0 = time.perf_counter()
+
+from app.cli import main  # noqa: E402
+
+raise SystemExit(main(t0=_T0))
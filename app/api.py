@@ -0,0 +1,333 @@
+"""
+Local read API over the pipeline's output.
+
+The pipeline writes a snapshot (data/beckley_rates.json) and appends one line per
+run to data/rates_history.jsonl. RatesIndex keeps both in memory, keyed by
+(market, property, checkin), and refreshes cheaply:
+  - the snapshot is re-parsed only when its size/mtime changes, and only the rows
+    that actually changed bump their market's version;
+  - the history file is append-only, so we read from the last byte offset.
+
+Responses are rendered once per (route, params, version) and shared by every
+viewer; ETag/If-None-Match lets repeat polls get a bodiless 304.
+
+  GET /grid?market=Beckley[&checkin=YYYY-MM-DD | &label=Today]
+  GET /history?hotel=Courtyard Beckley[&checkin=YYYY-MM-DD]
+  GET /alerts[?market=Beckley]
+  GET /healthz
+"""
+from __future__ import annotations
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import yaml
+
+from app import run_jobs
+
+RULES = Path("config/rules.yml")
+MIN_CHECK_INTERVAL_S = 1.0  # at most one stat() pair per second, however many viewers
+
+MAX_CACHED = 512  # distinct (route, params) bodies kept
+ALERTS_CLOCK_S = 3600  # /alerts bodies are re-rendered at least hourly so no_data_days can trip
+
+Key = Tuple[str, str, str]  # (market, property, checkin iso)
+
+def _fingerprint(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+def _primary_price(entry: Any) -> Optional[int]:
+    if isinstance(entry, dict) and isinstance((entry.get("primary") or {}).get("price"), int):
+        return entry["primary"]["price"]
+    return None
+
+def _parse_ts(ts: Optional[str]) -> Optional[datetime]:
+    if not ts:
+        return None
+    try:
+        return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def _checkin_dates(payload: Dict[str, Any]) -> Dict[str, str]:
+    dates = payload.get("checkin_dates")
+    if isinstance(dates, dict) and dates:
+        return dates
+    # older payloads only carry labels; rebuild them from the run date
+    gen = _parse_ts(payload.get("generated_at"))
+    if gen is None:
+        return {}
+    return {k: v.isoformat() for k, v in run_jobs._label_dates(gen.date()).items()}
+
+class RatesIndex:
+    def __init__(self, data_path: Path = run_jobs.DATA, history_path: Path = run_jobs.HISTORY,
+                 config_path: Path = run_jobs.CONFIG, rules_path: Path = RULES):
+        self.data_path, self.history_path = data_path, history_path
+        self.config_path, self.rules_path = config_path, rules_path
+
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._data_fp: Optional[Tuple[int, int]] = None
+        self._cfg_fp: Optional[Tuple[int, int]] = None
+        self._bad_cfg_fp: Optional[Tuple[int, int]] = None  # last config that failed to parse
+        self._hist_offset = 0
+
+        self.generated_at: Optional[str] = None
+        self.labels: Dict[str, str] = {}                   # label -> checkin iso
+        self.labels_by_market: Dict[str, Dict[str, str]] = {}
+        self.rows: Dict[Key, Any] = {}                     # (market, hotel, checkin) -> entry
+        self.history: Dict[str, List[Dict[str, Any]]] = {} # hotel -> [{generated_at, checkin, price}]
+        self.market_of: Dict[str, str] = {}
+        self.mine: set[str] = {run_jobs.YOUR_HOTEL}
+        self.rules: Dict[str, Any] = {}
+
+        self._market_ver: Dict[str, int] = {}
+        self._hotel_ver: Dict[str, int] = {}
+        self._cache: Dict[str, Tuple[Any, str, bytes]] = {}  # request key -> (version, etag, body)
+
+    # ----------------- loading -----------------
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._checked_at < MIN_CHECK_INTERVAL_S:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < MIN_CHECK_INTERVAL_S:
+                return
+            self._checked_at = now
+            cfg_fp = (_fingerprint(self.config_path), _fingerprint(self.rules_path))
+            if cfg_fp != self._cfg_fp and cfg_fp != self._bad_cfg_fp:
+                try:
+                    self._load_config()
+                except (OSError, ValueError, yaml.YAMLError) as e:  # a typo must not break every request
+                    self._bad_cfg_fp = cfg_fp
+                    print(f"[API] config reload failed ({type(e).__name__}: {e}); keeping previous config")
+                else:
+                    self._cfg_fp, self._bad_cfg_fp = cfg_fp, None
+                    self._data_fp = None  # market mapping may have moved rows
+            data_fp = _fingerprint(self.data_path)
+            if data_fp != self._data_fp and self._load_snapshot():
+                self._data_fp = data_fp  # a failed parse is retried on the next check
+            self._tail_history()
+
+    def _load_config(self) -> None:
+        """Parses both files before touching any state, so a failure leaves the old config in place."""
+        cfg = yaml.safe_load(self.config_path.read_text(encoding="utf-8")) if self.config_path.exists() else {}
+        rules = yaml.safe_load(self.rules_path.read_text(encoding="utf-8")) if self.rules_path.exists() else {}
+        if not isinstance(cfg or {}, dict) or not isinstance(rules or {}, dict):
+            raise ValueError("expected a mapping at the top level")
+        market_of, mine = {}, set()
+        for p in (cfg or {}).get("properties", []):
+            market_of[p.get("name")] = p.get("city") or ""
+            if p.get("is_mine"):
+                mine.add(p.get("name"))
+        alerts = (rules or {}).get("alerts", {}) or {}
+        if not isinstance(alerts, dict):
+            raise ValueError("rules.yml alerts must be a mapping")
+        self.market_of, self.mine, self.rules = market_of, mine or {run_jobs.YOUR_HOTEL}, alerts
+        for m in set(self.market_of.values()):
+            self._bump(self._market_ver, m.lower())  # thresholds feed alerts
+
+    def _market(self, hotel: str) -> str:
+        return self.market_of.get(hotel, "")
+
+    def _load_snapshot(self) -> bool:
+        try:
+            payload = json.loads(self.data_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False  # keep serving the last good snapshot (e.g. mid-write)
+        labels = _checkin_dates(payload)
+        by_market = payload.get("checkin_dates_by_market") or {}
+        rows: Dict[Key, Any] = {}
+        for label, day in (payload.get("rates_by_day") or {}).items():
+            for hotel, entry in (day or {}).items():
+                market = self._market(hotel)
+                checkin = (by_market.get(market) or {}).get(label) or labels.get(label, label)
+                rows[(market, hotel, checkin)] = entry
+
+        changed = {k[0] for k in rows.keys() ^ self.rows.keys()}
+        changed |= {k[0] for k in rows.keys() & self.rows.keys() if rows[k] != self.rows[k]}
+        if labels != self.labels or by_market != self.labels_by_market:
+            changed |= {k[0] for k in rows}
+        for m in changed:
+            self._bump(self._market_ver, m.lower())
+        self.rows, self.labels, self.labels_by_market = rows, labels, by_market
+        self.generated_at = payload.get("generated_at")
+        return True
+
+    def _tail_history(self) -> None:
+        fp = _fingerprint(self.history_path)
+        if fp is None:
+            return
+        if fp[0] < self._hist_offset:  # truncated/rotated: start over
+            self.history, self._hist_offset = {}, 0
+            for h in list(self._hotel_ver):
+                self._bump(self._hotel_ver, h)
+        if fp[0] == self._hist_offset:
+            return
+        with self.history_path.open("rb") as f:
+            f.seek(self._hist_offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1  # leave a half-written last line for next time
+        self._hist_offset += end
+        for raw in chunk[:end].splitlines():
+            try:
+                line = json.loads(raw)
+            except ValueError:
+                continue
+            dates = line.get("checkin_dates") or {}
+            by_market = line.get("checkin_dates_by_market") or {}
+            for label, day in (line.get("primary") or {}).items():
+                for hotel, price in (day or {}).items():
+                    checkin = (by_market.get(self._market(hotel)) or {}).get(label) or dates.get(label, label)
+                    self.history.setdefault(hotel, []).append(
+                        {"generated_at": line.get("generated_at"), "checkin": checkin, "price": price})
+                    self._bump(self._hotel_ver, hotel)
+                    self._bump(self._market_ver, self._market(hotel).lower())  # no_data alerts read history
+
+    @staticmethod
+    def _bump(versions: Dict[str, int], key: str) -> None:
+        versions[key] = versions.get(key, 0) + 1
+
+    # ----------------- queries -----------------
+    def grid(self, market: str, checkin: Optional[str] = None, label: Optional[str] = None) -> Dict[str, Any]:
+        if label and not checkin:
+            per_market = next((d for mk, d in self.labels_by_market.items() if mk.lower() == market.lower()), {})
+            checkin = per_market.get(label) or self.labels.get(label, label)
+        m = market.lower()
+        out: Dict[str, Dict[str, Any]] = {}
+        for (mk, hotel, ci), entry in self.rows.items():
+            if mk.lower() == m and (checkin is None or ci == checkin):
+                out.setdefault(ci, {})[hotel] = entry
+        res: Dict[str, Any] = {"market": market, "generated_at": self.generated_at}
+        if checkin is not None:
+            res.update(checkin=checkin, rates=out.get(checkin, {}))
+        else:
+            res.update(labels=self.labels, rates_by_checkin=out)
+        return res
+
+    def hotel_history(self, hotel: str, checkin: Optional[str] = None) -> Dict[str, Any]:
+        pts = [p for p in self.history.get(hotel, []) if checkin is None or p["checkin"] == checkin]
+        return {"hotel": hotel, "market": self._market(hotel), "points": pts}
+
+    def alerts(self, market: Optional[str] = None) -> Dict[str, Any]:
+        undercut = self.rules.get("undercut_threshold", 5)
+        parity = self.rules.get("parity_percent", 0.03)
+        no_data_days = self.rules.get("no_data_days", 1)
+        now = datetime.now(timezone.utc)
+        m = market.lower() if market else None
+
+        by_cell: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for (mk, hotel, ci), entry in self.rows.items():
+            if m is None or mk.lower() == m:
+                by_cell.setdefault((mk, ci), {})[hotel] = entry
+
+        alerts: List[Dict[str, Any]] = []
+        for (mk, ci), hotels in sorted(by_cell.items()):
+            mine = next((h for h in hotels if h in self.mine), None)
+            yours = _primary_price(hotels.get(mine)) if mine else None
+            for hotel, entry in hotels.items():
+                price = _primary_price(entry)
+                if price is None:
+                    last = max((_parse_ts(p["generated_at"]) for p in self.history.get(hotel, [])
+                                if p["price"] is not None and _parse_ts(p["generated_at"])), default=None)
+                    if last is None or now - last >= timedelta(days=no_data_days):
+                        alerts.append({"type": "no_data", "market": mk, "checkin": ci, "hotel": hotel,
+                                       "last_priced_at": last.isoformat() if last else None})
+                    continue
+                if hotel != mine and yours is not None and yours - price >= undercut:
+                    alerts.append({"type": "undercut", "market": mk, "checkin": ci, "hotel": hotel,
+                                   "price": price, "yours": yours, "by": yours - price})
+                if hotel == mine:
+                    ex = (entry.get("expedia") or {}).get("low")
+                    if isinstance(ex, int) and ex < price * (1 - parity):
+                        alerts.append({"type": "parity", "market": mk, "checkin": ci, "hotel": hotel,
+                                       "brand": price, "expedia_low": ex})
+        return {"generated_at": self.generated_at, "alerts": alerts}
+
+    # ----------------- rendering -----------------
+    def render(self, route: str, params: Dict[str, str]) -> Optional[Tuple[str, bytes]]:
+        """(etag, body) for a route, reusing the cached bytes while the inputs' version is unchanged."""
+        self.refresh()
+        if route == "/grid":
+            market = params.get("market") or min(self.market_of.values(), default="")
+            version: Any = self._market_ver.get(market.lower(), 0), self.generated_at
+            build = lambda: self.grid(market, params.get("checkin"), params.get("label"))
+        elif route == "/history" and params.get("hotel"):
+            version = self._hotel_ver.get(params["hotel"], 0)
+            build = lambda: self.hotel_history(params["hotel"], params.get("checkin"))
+        elif route == "/alerts":
+            # no_data alerts age with the clock, not just with file changes
+            clock = int(time.time() // ALERTS_CLOCK_S)
+            with self._lock:  # refresh() may be adding markets on another thread
+                version = tuple(sorted(self._market_ver.items())), self.generated_at, clock
+            build = lambda: self.alerts(params.get("market"))
+        elif route == "/healthz":
+            return None, json.dumps({"generated_at": self.generated_at, "rows": len(self.rows)}).encode()
+        else:
+            return None
+
+        key = route + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+        hit = self._cache.get(key)
+        if hit and hit[0] == version:
+            return hit[1], hit[2]
+        with self._lock:  # one viewer renders, the rest wait and reuse
+            hit = self._cache.get(key)
+            if hit and hit[0] == version:
+                return hit[1], hit[2]
+            body = json.dumps(build(), separators=(",", ":")).encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            if len(self._cache) >= MAX_CACHED:
+                self._cache.clear()
+            self._cache[key] = (version, etag, body)
+        return etag, body
+
+# ----------------- HTTP -----------------
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "RatesAPI/1"
+    index: RatesIndex  # set by serve()
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        out = self.index.render(url.path.rstrip("/") or "/", params)
+        if out is None:
+            return self._send(404, b'{"error":"not found"}')
+        etag, body = out
+        if etag and etag in (self.headers.get("If-None-Match") or ""):
+            return self._send(304, b"", etag)
+        self._send(200, body, etag)
+
+    def _send(self, status: int, body: bytes, etag: Optional[str] = None) -> None:
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        pass  # one line per poll is noise
+
+def serve(index: RatesIndex, host: str = "127.0.0.1", port: int = 8502) -> None:
+    index.refresh(force=True)
+    handler = type("Handler", (_Handler,), {"index": index})
+    with ThreadingHTTPServer((host, port), handler) as httpd:
+        print(f"Rates API on http://{host}:{port}/ ({len(index.rows)} rows, generated {index.generated_at})")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
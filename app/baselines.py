@@ -0,0 +1,170 @@
+"""
+Streaming price baselines per (hotel, check-in weekday, provider group).
+
+Each key holds [n, median, mad, rejected]: n counts nights, never individual offers
+or refreshes. A key learns once per check-in date (the first response for that night,
+using the group's median price); the scheduler's re-fetches of the same night and a
+hedged fetch parsing both addr and city only get screened. The last few dates applied
+per key are kept in `seen`.
+Updates are O(1) with a frugal (sign-step) estimator, so history is never rescanned:
+  median += step * sign(x - median)
+  mad    *= (1 + a) if |x - median| > mad else (1 - a)
+Steps start large (1/n) so a new key settles in a few nights, then shrink to a
+fixed rate so one odd night barely moves the baseline. MAD never drops below
+MIN_MAD_FRAC of the median, because hotel prices really do move that much.
+
+Offers far from their baseline (robust z > Z_MAX) are suspects. A suspect is still
+kept if it agrees with the other offers in the same response, since event nights
+lift every provider at once. Suspects never feed the estimator directly. After
+RECENTER_AFTER nights in a row with only suspects, the key re-centres on the new
+level. A response is never emptied: if every offer is a suspect, all of them are
+returned flagged ("suspect": True) and none are dropped.
+Baselines persist to data/baselines.json.
+"""
+from __future__ import annotations
+import json
+import os
+import statistics
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+BASELINES_PATH = Path("data/baselines.json")
+
+# hard sanity band: only rejects values no hotel here could charge; baselines do the rest
+SANITY_MIN, SANITY_MAX = 25, 2500
+
+ALPHA = 0.1          # long-run step rate
+MIN_OBS = 8          # nights before a key may veto offers
+Z_MAX = 3.5          # robust z-score (|x - median| / (1.4826 * mad)) beyond which an offer is suspect
+BATCH_MIN = 3        # offers needed in a response before batch agreement can rescue a suspect
+BATCH_TOL = 0.25     # "agrees with the batch" = within 25% of the response's median
+MIN_MAD_FRAC = 0.08  # MAD floor as a fraction of the median
+RECENTER_AFTER = 3   # consecutive all-suspect nights before a key jumps to the new level
+SEEN_KEEP = 4        # check-in dates remembered per key (Today/Tomorrow/Friday interleave)
+
+def sane(v: Optional[int]) -> bool:
+    return v is not None and SANITY_MIN <= v <= SANITY_MAX
+
+def _key(hotel: str, checkin: date, group: str) -> str:
+    return f"{hotel}|{checkin.weekday()}|{group}"
+
+def _floor(m: float) -> float:
+    return max(MIN_MAD_FRAC * m, 1.0)
+
+class Baselines:
+    def __init__(self, path: Path = BASELINES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.stats: Dict[str, List[float]] = {}  # key -> [n, median, mad, rejected]
+        self.seen: Dict[str, List[str]] = {}      # key -> check-in isos already learned from
+        try:
+            d = json.loads(path.read_text(encoding="utf-8"))
+            for k, v in (d.get("stats") or {}).items():
+                v = [float(x) for x in v]
+                self.stats[k] = v + [0.0] * (4 - len(v))  # v1 files had no rejected counter
+            self.seen = {k: list(v) for k, v in (d.get("seen") or {}).items()}
+        except (OSError, ValueError):
+            pass
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            body = {"v": 3, "stats": {k: [int(n), round(m, 2), round(d, 2), int(r)]
+                                      for k, (n, m, d, r) in self.stats.items()},
+                    "seen": self.seen}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(body, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, self.path)  # a crash mid-write must not wipe every baseline
+            self._dirty = False
+
+    # ----------------- per-key estimator -----------------
+    def update(self, key: str, x: float) -> None:
+        """One night's observation (the group's median price) for one key."""
+        with self._lock:
+            s = self.stats.get(key)
+            if s is None:
+                self.stats[key] = [1.0, float(x), _floor(x), 0.0]
+            else:
+                n, m, d, _ = s
+                n += 1
+                rate = max(1.0 / n, ALPHA)
+                if x > m:
+                    m += min(d * rate * 2, x - m)
+                elif x < m:
+                    m -= min(d * rate * 2, m - x)
+                d *= (1 + rate) if abs(x - m) > d else (1 - rate)
+                self.stats[key] = [n, m, max(d, _floor(m)), 0.0]
+            self._dirty = True
+
+    def reject(self, key: str, x: float) -> None:
+        """A night where every offer in the group was a suspect; enough in a row means the level moved."""
+        with self._lock:
+            s = self.stats.get(key)
+            if s is None:
+                return
+            s[3] += 1
+            if s[3] >= RECENTER_AFTER:
+                s[1], s[2], s[3] = float(x), _floor(x), 0.0
+            self._dirty = True
+
+    def first_time(self, key: str, checkin: date) -> bool:
+        """True (and remembered) the first time a night is offered to a key; repeats don't learn."""
+        night = checkin.isoformat()
+        with self._lock:
+            seen = self.seen.setdefault(key, [])
+            if night in seen:
+                return False
+            seen.append(night)
+            del seen[:-SEEN_KEEP]
+            self._dirty = True
+            return True
+
+    def zscore(self, key: str, x: float) -> Optional[float]:
+        s = self.stats.get(key)
+        if s is None or s[0] < MIN_OBS:
+            return None
+        _, m, d, _ = s
+        return abs(x - m) / (1.4826 * d)
+
+    # ----------------- offer screening -----------------
+    def screen(self, hotel: str, checkin: date, offers: List[Dict[str, Any]],
+               learn: bool = True) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Split offers into (kept, outliers); kept offers feed the baselines when learn=True.
+        If every offer is suspect, nothing is dropped: all come back in kept, flagged "suspect".
+        """
+        from app.selector import detect_provider_group  # selector imports this module's band
+
+        prices = [o["price"] for o in offers]
+        batch_med = statistics.median(prices) if len(prices) >= BATCH_MIN else None
+        flags: List[bool] = []
+        groups: Dict[str, List[Tuple[Dict[str, Any], bool]]] = {}
+        for o in offers:
+            key = _key(hotel, checkin, detect_provider_group(o.get("provider_ctx", "")))
+            z = self.zscore(key, o["price"])
+            suspect = z is not None and z > Z_MAX
+            if suspect and batch_med is not None and abs(o["price"] - batch_med) <= BATCH_TOL * batch_med:
+                suspect = False  # whole market moved (event night), not a bad parse
+            flags.append(suspect)
+            groups.setdefault(key, []).append((o, suspect))
+
+        if learn:
+            for key, items in groups.items():
+                if not self.first_time(key, checkin):
+                    continue
+                clean = [o["price"] for o, sus in items if not sus]
+                if clean:
+                    self.update(key, statistics.median(clean))
+                else:
+                    self.reject(key, statistics.median(o["price"] for o, _ in items))
+
+        kept = [o for o, sus in zip(offers, flags) if not sus]
+        outliers = [o for o, sus in zip(offers, flags) if sus]
+        if offers and not kept:
+            return [{**o, "suspect": True} for o in offers], []
+        return kept, outliers
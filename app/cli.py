@@ -0,0 +1,233 @@
+"""
+Unified entry point: `python -m app <command> [options]`.
+
+Commands:
+  fetch   live SerpAPI pull -> data/beckley_rates.json
+  replay  rebuild the payload offline from saved bodies in data/raw
+  bench   time the parse path over data/raw, or the brand fetcher against a HAR (no network)
+  serve   local read API (grid/history/alerts) for the dashboard and other tools
+  prune   delete old raw SerpAPI bodies
+  schedule  resident daemon: per-market local-time refreshes on a shared worker pool
+
+Only stdlib loads up front. Each command lists the modules it needs and they are
+imported (and timed) after argument parsing, so cron/CI calls that only prune or
+replay never pay for httpx/pandas/Playwright.
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import Callable, Optional
+
+def _ms(since: float) -> float:
+    return (time.perf_counter() - since) * 1000
+
+def _log(msg: str) -> None:
+    print(msg, file=sys.stderr)
+
+# ----------------- shared helpers -----------------
+def _emit(payload: dict, out: Optional[str], history: bool = False, merge: bool = False) -> int:
+    if out == "-":
+        json.dump(payload, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 0
+    from app import run_jobs
+    path = Path(out) if out else run_jobs.DATA
+    snapshot = run_jobs.merge_into(run_jobs.load_payload(path), payload) if merge else payload
+    run_jobs.write_payload(snapshot, path)
+    print(f"{'Merged into' if merge else 'Wrote'} {path.resolve()}")
+    if history:
+        run_jobs.append_history(payload)
+    return 0
+
+def _diagnostics(out: Optional[str]):
+    """With --out -, stdout carries only the JSON; the fetchers' [MISS]/[RAW]/... lines go to stderr."""
+    return contextlib.redirect_stdout(sys.stderr) if out == "-" else contextlib.nullcontext()
+
+def _run_pipeline(args, fetch: Optional[Callable]) -> dict | None:
+    from app import run_jobs
+    hotels = run_jobs._load_hotels(args.market)
+    if not hotels:
+        _log(f"No properties match market(s): {', '.join(args.market)}")
+        return None
+    dates = {d.isoformat(): d for d in args.date} if args.date else None
+    return run_jobs.build_payload(hotels, fetch, dates=dates, only=args.label)
+
+# ----------------- commands -----------------
+def _cmd_fetch(args) -> int:
+    if args.date and not args.out:
+        # ISO-keyed labels don't belong in the dashboard's Today/Tomorrow/Friday snapshot
+        _log("--date needs --out (a file or '-'); it would not show up in data/beckley_rates.json")
+        return 2
+    from app.fetchers import serpapi_google
+    with _diagnostics(args.out):
+        if not serpapi_google.SERPAPI_KEY:
+            print("WARNING: SERPAPI_KEY not set; live fetch will fail.")
+        payload = _run_pipeline(args, None)
+    if payload is None:
+        return 2
+    # a --market/--label subset updates its cells in the snapshot instead of replacing it
+    default_out = not args.out
+    return _emit(payload, args.out, history=default_out, merge=default_out and bool(args.market or args.label))
+
+def _cmd_replay(args) -> int:
+    from app.fetchers.serpapi_google import replay_brand_categorized_for_hotel
+    out = args.out or "-"
+    with _diagnostics(out):
+        payload = _run_pipeline(args, replay_brand_categorized_for_hotel)
+    return 2 if payload is None else _emit(payload, out)
+
+_RAW_RE = re.compile(r"^(?P<safe>.+)_(?P<d>\d{4}-\d{2}-\d{2})_(?P<tag>[a-z]+)_ok_\d{8}T\d{6}Z\.json$")
+
+def _bench_brand(args) -> int:
+    from app.fetchers import brand_playwright as bp
+    if bp.async_playwright is None:
+        _log("Playwright is not installed (pip install playwright && playwright install chromium)")
+        return 1
+    if args.brand_mode == "replay" and not bp.har_path(args.brand_url).exists():
+        _log(f"No HAR at {bp.har_path(args.brand_url)}; record one first with --brand-mode record")
+        return 1
+    timings = []
+    for _ in range(args.repeat):
+        t = time.perf_counter()
+        bp.fetch_brand_total(args.brand_url, date.today(), mode=args.brand_mode)
+        timings.append(_ms(t))
+    print(f"bench brand ({args.brand_mode}): {args.brand_url} x {args.repeat} -> "
+          f"mean {sum(timings)/len(timings):.0f} ms, min {min(timings):.0f} ms, max {max(timings):.0f} ms")
+    return 0
+
+def _cmd_bench(args) -> int:
+    if args.brand_url:
+        return _bench_brand(args)
+    from app import run_jobs
+    from app.fetchers import serpapi_google as sg
+    by_safe = {sg._safe_name(h["name"]): h for h in run_jobs._load_hotels(args.market)}
+    cells = []
+    for f in sorted(sg.RAW_DIR.glob("*_ok_*.json")):
+        m = _RAW_RE.match(f.name)
+        if m and m["safe"] in by_safe:
+            cells.append((f, by_safe[m["safe"]], date.fromisoformat(m["d"]), m["tag"]))
+    if not cells:
+        _log(f"No raw bodies under {sg.RAW_DIR} to bench")
+        return 1
+
+    timings: list[float] = []
+    hits = 0
+    # [MISS]/[OUTLIER] prints would time the terminal, not the parser
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        for _ in range(args.repeat):
+            for f, h, d, tag in cells:
+                t = time.perf_counter()
+                data = json.loads(f.read_text(encoding="utf-8"))
+                brand = h["brand"] if h["name"] == run_jobs.YOUR_HOTEL else None
+                res = sg._result_from_data(data, h["name"], h["city"], d, brand, tag, f.name, learn=False)
+                timings.append(_ms(t))
+                hits += res is not None
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+    print(f"bench: {len(cells)} bodies x {args.repeat} -> {hits}/{len(timings)} usable | "
+          f"total {sum(timings):.1f} ms, mean {sum(timings)/len(timings):.2f} ms, p95 {p95:.2f} ms")
+    return 0
+
+def _cmd_serve(args) -> int:
+    from app import api
+    index = api.RatesIndex(Path(args.data), Path(args.history))
+    api.serve(index, args.host, args.port)
+    return 0
+
+def _cmd_schedule(args) -> int:
+    import signal
+    from app.scheduler import Scheduler
+    sched = Scheduler(workers=args.workers)
+    if args.once:
+        sched.run_once()
+        return 0
+    signal.signal(signal.SIGTERM, lambda *_: sched.stop())
+    try:
+        sched.run_forever()
+    except KeyboardInterrupt:
+        sched.stop()
+    return 0
+
+def _cmd_prune(args) -> int:
+    from app.fetchers.serpapi_google import RAW_DIR
+    cutoff = time.time() - args.days * 86400
+    n, size = 0, 0
+    for f in RAW_DIR.glob("*.json"):
+        st = f.stat()
+        if st.st_mtime >= cutoff:
+            continue
+        n, size = n + 1, size + st.st_size
+        if not args.dry_run:
+            f.unlink()
+    verb = "Would delete" if args.dry_run else "Deleted"
+    print(f"{verb} {n} raw file(s), {size/1024:.1f} KiB older than {args.days}d in {RAW_DIR}")
+    return 0
+
+# name -> (handler, modules imported up front and timed)
+COMMANDS: dict[str, tuple[Callable, tuple[str, ...]]] = {
+    "fetch":  (_cmd_fetch,  ("app.run_jobs", "app.fetchers.serpapi_google", "httpx")),
+    "replay": (_cmd_replay, ("app.run_jobs", "app.fetchers.serpapi_google")),
+    "bench":  (_cmd_bench,  ("app.run_jobs", "app.fetchers.serpapi_google")),
+    "serve":  (_cmd_serve,  ("app.api",)),
+    "prune":  (_cmd_prune,  ("app.fetchers.serpapi_google",)),
+    "schedule": (_cmd_schedule, ("app.scheduler", "app.fetchers.serpapi_google", "httpx")),
+}
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="python -m app", description="Hotel rate tracker pipeline")
+    ap.add_argument("-q", "--quiet", action="store_true", help="don't print startup timing")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    sel = argparse.ArgumentParser(add_help=False)
+    sel.add_argument("--market", action="append", metavar="CITY",
+                     help="only properties in this city (repeatable; default: all)")
+    sel.add_argument("--date", action="append", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                     help="explicit check-in date (repeatable; replaces Today/Tomorrow/Friday)")
+    sel.add_argument("--label", action="append", choices=("Today", "Tomorrow", "Friday"),
+                     help="subset of the default labels (repeatable)")
+    sel.add_argument("--out", metavar="PATH", help="output file, or '-' for stdout")
+
+    sub.add_parser("fetch", parents=[sel], help="live SerpAPI fetch (default out: data/beckley_rates.json)")
+    sub.add_parser("replay", parents=[sel], help="rebuild payload from data/raw (default out: stdout)")
+
+    b = sub.add_parser("bench", help="time parsing of saved raw bodies")
+    b.add_argument("--market", action="append", metavar="CITY")
+    b.add_argument("--repeat", type=int, default=3)
+    b.add_argument("--brand-url", metavar="URL", help="time the Playwright brand fetcher instead")
+    b.add_argument("--brand-mode", choices=("live", "record", "replay"), default="replay",
+                   help="Playwright mode for --brand-url (default: replay from data/har)")
+
+    s = sub.add_parser("serve", help="local read API over the latest rates")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--port", type=int, default=8502)
+    s.add_argument("--data", default="data/beckley_rates.json")
+    s.add_argument("--history", default="data/rates_history.jsonl")
+
+    p = sub.add_parser("prune", help="delete raw SerpAPI bodies older than N days")
+    p.add_argument("--days", type=float, default=5)
+    p.add_argument("--dry-run", action="store_true")
+
+    d = sub.add_parser("schedule", help="run the resident scheduler (config/rules.yml: schedule)")
+    d.add_argument("--workers", type=int, help="override schedule.workers")
+    d.add_argument("--once", action="store_true", help="run what's due now, then exit")
+    return ap
+
+def main(argv: Optional[list[str]] = None, t0: Optional[float] = None) -> int:
+    t0 = time.perf_counter() if t0 is None else t0
+    args = build_parser().parse_args(argv)
+    handler, modules = COMMANDS[args.command]
+
+    t_imp = time.perf_counter()
+    for mod in modules:
+        importlib.import_module(mod)
+    if not args.quiet:
+        _log(f"[CLI] {args.command}: startup {_ms(t0):.1f} ms (imports {_ms(t_imp):.1f} ms)")
+    return handler(args)
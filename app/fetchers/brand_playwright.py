@@ -5,12 +5,28 @@ Once you add a specific hotel's booking URL and CSS selectors for the final pric
 this will return a 'total with taxes' integer. Until then, it returns None so the
 pipeline falls back to SerpAPI.
 
+Modes (BRAND_PW_MODE or the `mode` argument):
+  live    persistent profile in data/pw_profile, so the disk cache and cookies
+          survive between runs
+  record  fresh context; the page's traffic is saved to data/har/<site>.har
+  replay  fresh context served only from that HAR (no network), for offline
+          tests and benchmarks
+Every mode skips images, fonts, media and known trackers. Live mode blocks them
+through a CDP session (Network.setBlockedURLs), because any ctx.route handler turns
+off Playwright's HTTP cache and the profile's disk cache would go unused. Record and
+replay run without a cache anyway, so they use a route that resource-type filters.
+
 NOTE: Scraping brand sites may be restricted by Terms of Service. Use official APIs
 or partner access when possible for production.
 """
 from __future__ import annotations
 import asyncio
+import os
+import re
 from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
 
 try:
     # import lazily so Streamlit doesn't need Playwright at runtime
@@ -18,46 +34,116 @@ try:
 except Exception:  # pragma: no cover
     async_playwright = None  # type: ignore
 
+PROFILE_DIR = Path(os.getenv("BRAND_PW_PROFILE", "data/pw_profile"))
+HAR_DIR = Path("data/har")
+MODES = ("live", "record", "replay")
+
+BLOCKED_TYPES = {"image", "font", "media"}
+BLOCKED_HOSTS = (
+    "doubleclick.net", "google-analytics.com", "googletagmanager.com", "googlesyndication.com",
+    "facebook.net", "facebook.com", "hotjar.com", "demdex.net", "omtrdc.net", "adobedtm.com",
+    "bing.com", "criteo.com", "quantserve.com", "scorecardresearch.com",
+)
+
+# live mode blocks by URL pattern (CDP can't see resource types before the request)
+BLOCKED_EXTS = ("png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico",
+                "woff", "woff2", "ttf", "otf", "mp4", "webm", "mp3")
+BLOCKED_URL_PATTERNS = [f"*.{ext}" for ext in BLOCKED_EXTS] + [f"*.{ext}?*" for ext in BLOCKED_EXTS] \
+    + [f"*{h}/*" for h in BLOCKED_HOSTS]
+
 def nightly_from_total(total: int, nights: int) -> int:
     return round(total / max(1, nights))
 
-async def _fetch_total_example(hotel_url: str, checkin: date, nights: int, adults: int) -> int | None:
+def har_path(hotel_url: str) -> Path:
+    u = urlsplit(hotel_url)
+    return HAR_DIR / (re.sub(r"[^a-zA-Z0-9]+", "_", f"{u.netloc}{u.path}").strip("_") + ".har")
+
+async def _block_unneeded(route) -> None:
+    req = route.request
+    host = urlsplit(req.url).hostname or ""
+    if req.resource_type in BLOCKED_TYPES or any(host == h or host.endswith("." + h) for h in BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.fallback()  # on to the HAR router (replay) or the network
+
+async def _block_via_cdp(ctx, page) -> None:
+    """Live mode: block at the network layer so the persistent HTTP cache stays on."""
+    cdp = await ctx.new_cdp_session(page)
+    await cdp.send("Network.enable")
+    await cdp.send("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+
+async def _open_context(p, hotel_url: str, mode: str):
+    """Returns (context, closer). Record/replay use a throwaway context so the cache can't hide requests."""
+    if mode == "live":
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        ctx = await p.chromium.launch_persistent_context(str(PROFILE_DIR), locale="en-US")
+        return ctx, ctx.close
+
+    browser = await p.chromium.launch()
+    har = har_path(hotel_url)
+    if mode == "record":
+        har.parent.mkdir(parents=True, exist_ok=True)
+        ctx = await browser.new_context(locale="en-US", record_har_path=str(har), record_har_mode="minimal")
+    else:
+        ctx = await browser.new_context(locale="en-US")
+        await ctx.route_from_har(str(har), not_found="abort")
+
+    async def _close():
+        await ctx.close()  # flushes the HAR in record mode
+        await browser.close()
+    return ctx, _close
+
+async def _fetch_total_example(hotel_url: str, checkin: date, nights: int, adults: int,
+                               mode: str = "live") -> int | None:
     """
     TEMPLATE for a brand site. Replace selectors with the site's DOM.
     """
     if async_playwright is None:
         return None
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    if mode == "replay" and not har_path(hotel_url).exists():
+        print(f"[MISS] {hotel_url} -> no HAR at {har_path(hotel_url)} (run once with mode=record)")
+        return None
 
     checkout = checkin + timedelta(days=nights)
     async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        ctx = await browser.new_context(locale="en-US")
-        page = await ctx.new_page()
+        ctx, close = await _open_context(p, hotel_url, mode)
+        try:
+            if mode == "live":
+                page = ctx.pages[0] if ctx.pages else await ctx.new_page()
+                await _block_via_cdp(ctx, page)
+            else:
+                # registered last, so it runs before the HAR router and can abort first
+                await ctx.route("**/*", _block_unneeded)
+                page = await ctx.new_page()
 
-        # 1) open search page
-        await page.goto(hotel_url, wait_until="networkidle")
+            # 1) open search page (record waits for the network to settle so the HAR is complete)
+            await page.goto(hotel_url, wait_until="networkidle" if mode == "record" else "domcontentloaded")
 
-        # 2) TODO: fill check-in, checkout, guests; submit (selectors differ per brand)
-        # await page.fill("css=[data-test=checkin]", checkin.strftime("%Y-%m-%d"))
-        # await page.fill("css=[data-test=checkout]", checkout.strftime("%Y-%m-%d"))
-        # await page.click("css=[data-test=guests]")
-        # await page.click("css=[data-test=search]")
+            # 2) TODO: fill check-in, checkout, guests; submit (selectors differ per brand)
+            # await page.fill("css=[data-test=checkin]", checkin.strftime("%Y-%m-%d"))
+            # await page.fill("css=[data-test=checkout]", checkout.strftime("%Y-%m-%d"))
+            # await page.click("css=[data-test=guests]")
+            # await page.click("css=[data-test=search]")
 
-        # 3) TODO: wait for results and extract total price *with taxes*
-        # await page.wait_for_selector("css=.total-price")
-        # price_text = await page.text_content("css=.total-price")
-
-        await browser.close()
+            # 3) TODO: wait for results and extract total price *with taxes*
+            # await page.wait_for_selector("css=.total-price")
+            # price_text = await page.text_content("css=.total-price")
+        finally:
+            await close()  # a failed goto/selector must not leak the browser (or the profile lock)
         return None  # until selectors are provided
 
-def fetch_brand_total(hotel_url: str, checkin: date, nights: int = 1, adults: int = 2) -> int | None:
+def fetch_brand_total(hotel_url: str, checkin: date, nights: int = 1, adults: int = 2,
+                      mode: Optional[str] = None) -> int | None:
     """
     Synchronous wrapper for GitHub Actions convenience.
     """
+    mode = mode or os.getenv("BRAND_PW_MODE", "live")
     try:
         return asyncio.get_event_loop().run_until_complete(
-            _fetch_total_example(hotel_url, checkin, nights, adults)
+            _fetch_total_example(hotel_url, checkin, nights, adults, mode)
         )
     except RuntimeError:
         # if no running loop
-        return asyncio.run(_fetch_total_example(hotel_url, checkin, nights, adults))
+        return asyncio.run(_fetch_total_example(hotel_url, checkin, nights, adults, mode))
@@ -0,0 +1,99 @@
+"""
+Hedging state for the SerpAPI addr -> city fallback.
+
+Tracks three things, persisted in data/hedge_stats.json so cron runs share them:
+  - recent latencies of the precise "addr" query (to learn when it's "late"),
+  - per-hotel streaks of the precise query answering with no usable offers,
+  - a per-UTC-day budget of extra (speculative) city queries.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Deque, Dict, Optional
+
+STATS_PATH = Path("data/hedge_stats.json")
+WINDOW = 200           # addr latencies kept
+MIN_SAMPLES = 20       # below this, use DEFAULT_DELAY_S
+DEFAULT_DELAY_S = 6.0
+MIN_DELAY_S = 1.5      # never hedge faster than this, whatever the percentile says
+CITY_STREAK = 2        # consecutive addr misses before a hotel fires both queries at once
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+class HedgeStats:
+    def __init__(self, path: Path = STATS_PATH,
+                 percentile: float = float(os.getenv("SERPAPI_HEDGE_PCTL", "0.9")),
+                 daily_budget: int = int(os.getenv("SERPAPI_HEDGE_BUDGET", "25"))):
+        self.path = path
+        self.percentile = percentile
+        self.daily_budget = daily_budget
+        self._lock = threading.Lock()
+        self.latencies: Deque[float] = deque(maxlen=WINDOW)
+        self.city_streak: Dict[str, int] = {}
+        self.budget_day, self.budget_used = _today(), 0
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            d = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        self.latencies.extend(float(x) for x in d.get("addr_latency_s", []))
+        self.city_streak = {k: int(v) for k, v in (d.get("city_streak") or {}).items()}
+        if d.get("budget_day") == self.budget_day:
+            self.budget_used = int(d.get("budget_used", 0))
+
+    def save(self) -> None:
+        with self._lock:
+            d = {
+                "addr_latency_s": [round(x, 3) for x in self.latencies],
+                "city_streak": self.city_streak,
+                "budget_day": self.budget_day,
+                "budget_used": self.budget_used,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(d, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, self.path)  # a truncated file would silently reset the budget
+
+    # ----------------- learning -----------------
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def record_addr_outcome(self, hotel: str, usable: Optional[bool]) -> None:
+        """usable=False only when addr answered with nothing usable; None (timed out, cancelled) teaches nothing."""
+        if usable is None:
+            return
+        with self._lock:
+            if usable:
+                self.city_streak.pop(hotel, None)
+            else:
+                self.city_streak[hotel] = self.city_streak.get(hotel, 0) + 1
+
+    # ----------------- decisions -----------------
+    def needs_city(self, hotel: str) -> bool:
+        return self.city_streak.get(hotel, 0) >= CITY_STREAK
+
+    def delay_s(self) -> float:
+        """How long the addr query may be outstanding before the city hedge fires."""
+        with self._lock:
+            if len(self.latencies) < MIN_SAMPLES:
+                return DEFAULT_DELAY_S
+            xs = sorted(self.latencies)
+        return max(MIN_DELAY_S, xs[min(len(xs) - 1, int(self.percentile * len(xs)))])
+
+    def take_budget(self) -> bool:
+        """Reserve one speculative query for today; False once the daily cap is spent."""
+        with self._lock:
+            if self.budget_day != _today():
+                self.budget_day, self.budget_used = _today(), 0
+            if self.budget_used >= self.daily_budget:
+                return False
+            self.budget_used += 1
+            return True
@@ -4,11 +4,19 @@ from datetime import date, timedelta, datetime
 from difflib import SequenceMatcher
 from typing import Optional, Dict, Any, List
 from pathlib import Path
+import json
 import statistics
-import httpx
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+from app.baselines import Baselines, sane
+from app.fetchers.hedging import HedgeStats
 
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
+SERPAPI_URL = "https://serpapi.com/search.json"
 RAW_DIR = Path("data/raw")
+HEDGE_ENABLED = os.getenv("SERPAPI_HEDGE", "1") != "0"
 
 # ----------------- basics -----------------
 def _iso(d: date) -> str: return d.isoformat()
@@ -23,11 +31,14 @@ def _to_int(val) -> Optional[int]:
     return int(m.group(1).replace(",", "")) if m else None
 
 def _nightly_ok(v: Optional[int]) -> bool:
-    return v is not None and 40 <= v <= 600  # guardrails for this market
+    return sane(v)  # loose band only; per-hotel baselines catch the rest
+
+def _safe_name(hotel_name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9]+", "_", hotel_name).strip("_")
 
 def _save_raw(hotel_name: str, checkin: date, body: str, suffix: str) -> Path:
     RAW_DIR.mkdir(parents=True, exist_ok=True)
-    safe = re.sub(r"[^a-zA-Z0-9]+", "_", hotel_name).strip("_")
+    safe = _safe_name(hotel_name)
     fname = f"{safe}_{checkin.isoformat()}_{suffix}_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json"
     out = RAW_DIR / fname
     out.write_text(body, encoding="utf-8")
@@ -224,6 +235,118 @@ def _summarize_expedia(offers: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]
     avg = int(round(statistics.mean(ex_prices)))
     return {"low": ex_prices[0], "high": ex_prices[-1], "avg": avg, "count": len(ex_prices)}
 
+# ----------------- parse (live + replay) -----------------
+def _result_from_data(
+    data: Dict[str, Any],
+    hotel_name: str,
+    city: str,
+    checkin: date,
+    brand: Optional[str],
+    tag: str,
+    raw_used: str,
+    learn: bool = True,
+) -> Optional[Dict[str, Any]]:
+    offers: List[Dict[str, Any]] = []
+
+    props = _properties_from(data)
+    if props:
+        pr = _best_match(props, hotel_name, city, ("name","title"))
+        if pr:
+            offers += _offers_from_property(pr)
+
+    ads = _ads_from(data)
+    if ads:
+        ad = _best_match(ads, hotel_name, city, ("name","title"))
+        if ad:
+            offers += _offers_from_ad(ad)
+
+    offers = [o for o in offers if _nightly_ok(o.get("price"))]
+    offers, outliers = price_baselines().screen(hotel_name, checkin, offers, learn=learn)
+    if outliers:
+        print(f"[OUTLIER] {hotel_name} {checkin} -> dropped {sorted(o['price'] for o in outliers)} ({tag})")
+    suspects = sorted(o["price"] for o in offers if o.get("suspect"))
+    if suspects:
+        print(f"[SUSPECT] {hotel_name} {checkin} -> every offer off-baseline, kept flagged {suspects} ({tag})")
+    if not offers:
+        print(f"[MISS] {hotel_name} {checkin} -> no usable offers ({tag})")
+        return None
+
+    # brand-only pool for PRIMARY
+    brand_offers = [o for o in offers if _is_brand_provider(o.get("provider_ctx",""), brand)] if brand else offers
+    primary = _pick_brand_public_refundable_primary(brand_offers)
+
+    # category ranges (use brand pool if brand specified)
+    cats_all = _categorize(offers)
+    ranges = _summarize_ranges(_categorize(brand_offers)) if brand else _summarize_ranges(cats_all)
+
+    # expedia summary from ALL offers (not brand-filtered)
+    expedia = _summarize_expedia(offers)
+
+    # debug breadcrumb
+    debug: Dict[str, Any] = {"raw_file": raw_used}
+    if outliers:
+        debug["outliers"] = sorted(o["price"] for o in outliers)
+    if suspects:
+        debug["suspect"] = suspects
+    if primary:
+        match = None
+        for o in brand_offers:
+            if o.get("price") == primary["price"] and (o.get("source") == primary.get("source")):
+                match = o
+                break
+        if match:
+            debug["provider_ctx"] = match.get("provider_ctx")
+            debug["picked_from"] = match.get("source")
+
+    return {
+        "primary": primary,
+        "ranges": ranges,
+        "expedia": expedia,
+        "brand_strict": bool(brand),
+        "debug": debug
+    }
+
+# ----------------- shared client / hedge pool -----------------
+_INIT_LOCK = threading.Lock()
+_CLIENT = None
+_POOL: Optional[ThreadPoolExecutor] = None
+_HEDGE: Optional[HedgeStats] = None
+_BASELINES: Optional[Baselines] = None
+
+def _client():
+    """One pooled httpx.Client per process (thread-safe), instead of a new TLS handshake per query."""
+    global _CLIENT
+    if _CLIENT is None:
+        with _INIT_LOCK:
+            if _CLIENT is None:
+                import httpx  # lazy: replay/bench/serve never touch the network
+                _CLIENT = httpx.Client(timeout=httpx.Timeout(25.0, connect=10))
+    return _CLIENT
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _INIT_LOCK:
+            if _POOL is None:
+                _POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="serpapi")
+    return _POOL
+
+def hedge_stats() -> HedgeStats:
+    global _HEDGE
+    if _HEDGE is None:
+        with _INIT_LOCK:
+            if _HEDGE is None:
+                _HEDGE = HedgeStats()
+    return _HEDGE
+
+def price_baselines() -> Baselines:
+    global _BASELINES
+    if _BASELINES is None:
+        with _INIT_LOCK:
+            if _BASELINES is None:
+                _BASELINES = Baselines()
+    return _BASELINES
+
 # ----------------- public function -----------------
 def fetch_brand_categorized_for_hotel(
     hotel_name: str,
@@ -238,8 +361,15 @@ def fetch_brand_categorized_for_hotel(
     currency: str = "USD",
     timeout_s: float = 25.0,
     retries: int = 2,
+    hedge: Optional[bool] = None,  # default: SERPAPI_HEDGE env (on unless "0")
 ) -> Optional[Dict[str, Any]]:
     """
+    Runs the precise "addr" query; if it is still outstanding past the learned
+    latency percentile (or the hotel is known to only match on "city"), the relaxed
+    "city" query is launched alongside it. First usable result wins and the other
+    query is cancelled. Speculative city queries are capped per day
+    (SERPAPI_HEDGE_BUDGET); with hedge=False it's the plain addr-then-city chain.
+
     Returns:
       {
         "primary": {...},           # brand.com public refundable
@@ -253,7 +383,11 @@ def fetch_brand_categorized_for_hotel(
         print(f"[MISS] {hotel_name} {checkin} -> SERPAPI_KEY missing")
         return None
 
-    def _query(q: str, tag: str) -> Optional[Dict[str, Any]]:
+    import httpx  # lazy: replay/bench/serve never touch the network
+    stats = hedge_stats()
+    outcome: Dict[str, str] = {}  # tag -> ok | no_offers | http_error | cancelled
+
+    def _query(q: str, tag: str, cancel: threading.Event) -> Optional[Dict[str, Any]]:
         params = {
             "engine": "google_hotels",
             "q": q,
@@ -268,76 +402,118 @@ def fetch_brand_categorized_for_hotel(
 
         raw_used = ""
         body = ""
+        t_start = time.perf_counter()
         for attempt in range(retries + 1):
+            if cancel.is_set():
+                outcome[tag] = "cancelled"
+                return None
             try:
-                with httpx.Client(timeout=httpx.Timeout(timeout_s, read=timeout_s, write=timeout_s/2, connect=10)) as client:
-                    r = client.get("https://serpapi.com/search.json", params=params)
-                    r.raise_for_status()
-                    body = r.text
+                r = _client().get(SERPAPI_URL, params=params,
+                                  timeout=httpx.Timeout(timeout_s, read=timeout_s, write=timeout_s/2, connect=10))
+                r.raise_for_status()
+                body = r.text
                 break
             except Exception as e:
+                if cancel.is_set() or attempt == retries:
+                    if tag == "addr":
+                        stats.record_latency(timeout_s)  # failures count as "at least a full timeout"
+                if cancel.is_set():
+                    outcome[tag] = "cancelled"
+                    return None
                 if attempt == retries:
+                    outcome[tag] = "http_error"
                     p_err = _save_raw(hotel_name, checkin, f'{{"error":"{type(e).__name__}","detail":"{str(e)}"}}', f"{tag}_http_error")
                     print(f"[MISS] {hotel_name} {checkin} -> HTTP error ({tag}). Raw: {p_err.name}")
                     return None
+        if tag == "addr":
+            stats.record_latency(time.perf_counter() - t_start)  # all attempts, not just the last
+
+        if cancel.is_set():
+            outcome[tag] = "cancelled"
+            print(f"[HEDGE] {hotel_name} {checkin} -> {tag} answered after the other query won; dropped")
+            return None
 
         p_ok = _save_raw(hotel_name, checkin, body, f"{tag}_ok")
         raw_used = p_ok.name
         print(f"[RAW]  {hotel_name} {checkin} -> {raw_used}")
 
-        data = r.json()
-        offers: List[Dict[str, Any]] = []
-
-        props = _properties_from(data)
-        if props:
-            pr = _best_match(props, hotel_name, city, ("name","title"))
-            if pr:
-                offers += _offers_from_property(pr)
-
-        ads = _ads_from(data)
-        if ads:
-            ad = _best_match(ads, hotel_name, city, ("name","title"))
-            if ad:
-                offers += _offers_from_ad(ad)
-
-        offers = [o for o in offers if _nightly_ok(o.get("price"))]
-        if not offers:
-            print(f"[MISS] {hotel_name} {checkin} -> no usable offers ({tag})")
-            return None
-
-        # brand-only pool for PRIMARY
-        brand_offers = [o for o in offers if _is_brand_provider(o.get("provider_ctx",""), brand)] if brand else offers
-        primary = _pick_brand_public_refundable_primary(brand_offers)
-
-        # category ranges (use brand pool if brand specified)
-        cats_all = _categorize(offers)
-        ranges = _summarize_ranges(_categorize(brand_offers)) if brand else _summarize_ranges(cats_all)
-
-        # expedia summary from ALL offers (not brand-filtered)
-        expedia = _summarize_expedia(offers)
-
-        # debug breadcrumb
-        debug: Dict[str, Any] = {"raw_file": raw_used}
-        if primary:
-            match = None
-            for o in brand_offers:
-                if o.get("price") == primary["price"] and (o.get("source") == primary.get("source")):
-                    match = o
-                    break
-            if match:
-                debug["provider_ctx"] = match.get("provider_ctx")
-                debug["picked_from"] = match.get("source")
-
-        return {
-            "primary": primary,
-            "ranges": ranges,
-            "expedia": expedia,
-            "brand_strict": bool(brand),
-            "debug": debug
-        }
+        res = _result_from_data(r.json(), hotel_name, city, checkin, brand, tag, raw_used)
+        outcome[tag] = "ok" if res is not None else "no_offers"
+        return res
 
-    # precise then relaxed
-    res = _query(f"{hotel_name}, {address}", "addr")
-    if res is not None:
+    def _addr_usable() -> Optional[bool]:
+        return {"ok": True, "no_offers": False}.get(outcome.get("addr", ""))
+
+    addr_q, city_q = f"{hotel_name}, {address}", f"{hotel_name}, {city}"
+    if not (HEDGE_ENABLED if hedge is None else hedge):
+        # precise then relaxed
+        res = _query(addr_q, "addr", threading.Event())
+        if res is None:
+            res = _query(city_q, "city", threading.Event())
+        stats.record_addr_outcome(hotel_name, _addr_usable())
+        stats.save()
+        price_baselines().save()
         return res
-    return _query(f"{hotel_name}, {city}", "city")
+
+    pool = _hedge_pool()
+    cancel = {"addr": threading.Event(), "city": threading.Event()}
+    futs = {pool.submit(_query, addr_q, "addr", cancel["addr"]): "addr"}
+    if stats.needs_city(hotel_name) and stats.take_budget():
+        # addr keeps coming back empty for this hotel; still speculative, so it spends budget
+        futs[pool.submit(_query, city_q, "city", cancel["city"])] = "city"
+    else:
+        done, _ = wait(futs, timeout=stats.delay_s())
+        if not done and stats.take_budget():
+            print(f"[HEDGE] {hotel_name} {checkin} -> addr slow, launching city")
+            futs[pool.submit(_query, city_q, "city", cancel["city"])] = "city"
+
+    res, winner = None, None
+    for f in as_completed(futs):
+        res = f.result()
+        if res is not None:
+            winner = futs[f]
+            break
+    if res is None and "city" not in futs.values():
+        res = _query(city_q, "city", cancel["city"])
+        winner = "city" if res is not None else None
+
+    usable = _addr_usable()  # read before cancelling, so a cancelled addr stays "unknown"
+    for tag, ev in cancel.items():
+        if tag != winner:
+            ev.set()
+    stats.record_addr_outcome(hotel_name, usable)
+    stats.save()
+    price_baselines().save()
+    return res
+
+def _latest_raw(hotel_name: str, checkin: date, tag: str) -> Optional[Path]:
+    files = sorted(RAW_DIR.glob(f"{_safe_name(hotel_name)}_{_iso(checkin)}_{tag}_ok_*.json"))
+    return files[-1] if files else None
+
+def replay_brand_categorized_for_hotel(
+    hotel_name: str,
+    address: str,
+    city: str,
+    checkin: date,
+    brand: Optional[str] = None,
+    nights: int = 1,
+    adults: int = 2,
+    **_: Any,
+) -> Optional[Dict[str, Any]]:
+    """
+    Offline twin of fetch_brand_categorized_for_hotel: re-parses the newest saved
+    SerpAPI bodies in data/raw (addr first, then city) instead of calling the API.
+    """
+    for tag in ("addr", "city"):
+        raw = _latest_raw(hotel_name, checkin, tag)
+        if raw is None:
+            continue
+        try:
+            data = json.loads(raw.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            print(f"[MISS] {hotel_name} {checkin} -> unreadable raw ({raw.name})")
+            continue
+        res = _result_from_data(data, hotel_name, city, checkin, brand, tag, raw.name, learn=False)
+        if res is not None:
+            return res
+    return None
@@ -1,29 +1,55 @@
 from pathlib import Path
 from datetime import datetime, timezone, date, timedelta
+from typing import Callable, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import json
 import os
 import yaml
 
-from app.fetchers.serpapi_google import fetch_brand_categorized_for_hotel
-
 DATA = Path("data/beckley_rates.json")
+HISTORY = Path("data/rates_history.jsonl")
 CONFIG = Path("config/properties.yml")
 YOUR_HOTEL = "Comfort Inn Beckley"
+DEFAULT_TZ = "America/New_York"
 
-def _load_hotels():
+def _load_hotels(markets: Optional[list[str]] = None):
     if not CONFIG.exists():
         raise FileNotFoundError("config/properties.yml not found")
     cfg = yaml.safe_load(CONFIG.read_text(encoding="utf-8")) or {}
+    wanted = {m.strip().lower() for m in markets} if markets else None
     hotels = []
     for p in cfg.get("properties", []):
+        city = p.get("city") or ""
+        if wanted is not None and city.lower() not in wanted:
+            continue
         hotels.append({
             "name": p.get("name"),
             "address": p.get("address") or f"{p.get('city','')}, {p.get('state','')}",
-            "city": p.get("city") or "",
-            "brand": (p.get("brand") or "").strip().lower()
+            "city": city,
+            "brand": (p.get("brand") or "").strip().lower(),
+            "timezone": p.get("timezone") or DEFAULT_TZ,
         })
+    if wanted is None or "beckley" in wanted:
+        if not any(h["name"] == YOUR_HOTEL for h in hotels):
+            hotels.append({"name": YOUR_HOTEL, "address": "Beckley, WV", "city": "Beckley", "brand": "choice", "timezone": DEFAULT_TZ})
     return hotels
 
+def _local_today(tz_name: Optional[str]) -> date:
+    try:
+        return datetime.now(ZoneInfo(tz_name or DEFAULT_TZ)).date()
+    except (ZoneInfoNotFoundError, ValueError):
+        return date.today()
+
+def _market_today(hotels: list[dict]) -> date:
+    """'Today' in one market's own timezone (its first property's), not the runner's."""
+    return _local_today(hotels[0].get("timezone") if hotels else None)
+
+def _by_market(hotels: list[dict]) -> dict[str, list[dict]]:
+    markets: dict[str, list[dict]] = {}
+    for h in hotels:
+        markets.setdefault(h["city"], []).append(h)
+    return markets
+
 def _next_friday(today: date) -> date:
     wd = today.weekday()
     if wd == 3: return today + timedelta(days=8)
@@ -32,11 +58,14 @@ def _next_friday(today: date) -> date:
 def _label_dates(today: date) -> dict[str, date]:
     return {"Today": today, "Tomorrow": today + timedelta(days=1), "Friday": _next_friday(today)}
 
-def fetch_day(checkin: date, hotels: list[dict]) -> dict[str, dict | str]:
+def fetch_day(checkin: date, hotels: list[dict], fetch: Optional[Callable] = None) -> dict[str, dict | str]:
+    if fetch is None:
+        # imported here so CLI subcommands that never hit SerpAPI don't pay for httpx
+        from app.fetchers.serpapi_google import fetch_brand_categorized_for_hotel as fetch
     day: dict[str, dict | str] = {}
     for h in hotels:
         brand_for_primary = h["brand"] if h["name"] == YOUR_HOTEL else None
-        res = fetch_brand_categorized_for_hotel(
+        res = fetch(
             hotel_name=h["name"],
             address=h["address"],
             city=h["city"],
@@ -47,26 +76,83 @@ def fetch_day(checkin: date, hotels: list[dict]) -> dict[str, dict | str]:
         day[h["name"]] = res if isinstance(res, dict) else "N/A"
     return day
 
+def build_payload(hotels: list[dict], fetch: Optional[Callable] = None,
+                  dates: Optional[dict[str, date]] = None, only: Optional[list[str]] = None) -> dict:
+    """
+    Labels (Today/Tomorrow/Friday) are resolved per market in its own timezone,
+    unless explicit `dates` are given; `only` keeps a subset of labels.
+    """
+    rates_by_day: dict[str, dict] = {}
+    by_market: dict[str, dict[str, str]] = {}
+    for market, group in _by_market(hotels).items():
+        labels = dates or _label_dates(_market_today(group))
+        if only:
+            labels = {k: v for k, v in labels.items() if k in only}
+        by_market[market] = {label: d.isoformat() for label, d in labels.items()}
+        for label, d in labels.items():
+            rates_by_day.setdefault(label, {}).update(fetch_day(d, group, fetch))
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "checkin_dates": _home_dates(by_market),
+        "checkin_dates_by_market": by_market,
+        "rates_by_day": rates_by_day,
+    }
+
+def _home_dates(by_market: dict[str, dict[str, str]]) -> dict[str, str]:
+    """Single label -> date map for older readers: YOUR_HOTEL's market (Beckley) when present."""
+    for market, dates in by_market.items():
+        if market.lower() == "beckley":
+            return dict(dates)
+    return dict(next(iter(by_market.values()), {}))
+
+def merge_into(base: dict, partial: dict) -> dict:
+    """Fold a partial payload (some markets/labels) into a full snapshot in place."""
+    base["generated_at"] = partial.get("generated_at")
+    for label, day in (partial.get("rates_by_day") or {}).items():
+        base.setdefault("rates_by_day", {}).setdefault(label, {}).update(day)
+    by_market = base.setdefault("checkin_dates_by_market", {})
+    for market, dates in (partial.get("checkin_dates_by_market") or {}).items():
+        by_market.setdefault(market, {}).update(dates)
+    base["checkin_dates"] = {**(base.get("checkin_dates") or {}), **_home_dates(by_market)}
+    return base
+
+def load_payload(path: Path = DATA) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def write_payload(payload: dict, path: Path = DATA) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    os.replace(tmp, path)  # readers (API, dashboard) never see a half-written file
+    return path
+
+def append_history(payload: dict, path: Path = HISTORY) -> Path:
+    """One compact line per run: primary price per (label, hotel), for /history queries."""
+    primary = {}
+    for label, day in payload.get("rates_by_day", {}).items():
+        primary[label] = {
+            hotel: (e.get("primary") or {}).get("price") if isinstance(e, dict) else None
+            for hotel, e in day.items()
+        }
+    line = {"generated_at": payload.get("generated_at"), "checkin_dates": payload.get("checkin_dates", {}),
+            "checkin_dates_by_market": payload.get("checkin_dates_by_market", {}), "primary": primary}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(line, separators=(",", ":")) + "\n")
+    return path
+
 def main():
     if not os.getenv("SERPAPI_KEY"):
         print("WARNING: SERPAPI_KEY not set; live fetch will fail.")
 
     hotels = _load_hotels()
-    if not any(h["name"] == YOUR_HOTEL for h in hotels):
-        hotels.append({"name": YOUR_HOTEL, "address": "Beckley, WV", "city": "Beckley", "brand": "choice"})
-
-    today = date.today()
-    labels = _label_dates(today)
-    rates_by_day = {label: fetch_day(d, hotels) for label, d in labels.items()}
-
-    payload = {
-        "generated_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "rates_by_day": rates_by_day,
-    }
-
-    DATA.parent.mkdir(parents=True, exist_ok=True)
-    DATA.write_text(json.dumps(payload, indent=2), encoding="utf-8")
-    print(f"Wrote {DATA.resolve()}")
+    payload = build_payload(hotels)
+    out = write_payload(payload)
+    append_history(payload)
+    print(f"Wrote {out.resolve()}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,268 @@
+"""
+Resident scheduler: `python -m app schedule`.
+
+One long-lived process instead of a daily cron. Config, the pooled SerpAPI client
+and hedge stats stay loaded between runs; properties.yml/rules.yml are re-read only
+when they change on disk.
+
+Each market (properties grouped by city) runs on its own local clock from the
+properties' `timezone`. rules.yml `schedule.cadences` says when each label
+refreshes, either `every_minutes` inside a local `between` window or at fixed
+local `at` times. Due (market, label) jobs run on one bounded worker pool and are
+merged into the shared snapshot as they finish, re-reading it first if another
+writer (e.g. `python -m app fetch`) changed it.
+
+Last-run times persist next to the snapshot (schedule_state.json), so a restart or
+`schedule --once` only runs jobs that are actually overdue, not every label at once.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dtime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import yaml
+
+from app import run_jobs
+
+RULES = Path("config/rules.yml")
+IDLE_MAX_S = 60.0  # re-check config at least this often
+
+DEFAULT_CADENCES: Dict[str, Dict[str, Any]] = {
+    "Today":    {"every_minutes": 120, "between": ["06:00", "23:00"]},
+    "Tomorrow": {"every_minutes": 240, "between": ["06:00", "23:00"]},
+    "Friday":   {"at": ["04:07"]},
+}
+
+Job = Tuple[str, str]  # (market, label)
+
+def _hhmm(s: str) -> dtime:
+    h, m = str(s).split(":")
+    return dtime(int(h), int(m))
+
+def _at(day, t: dtime, tz) -> datetime:
+    return datetime.combine(day, t, tzinfo=tz)
+
+def next_due(cadence: Dict[str, Any], after: datetime) -> datetime:
+    """Next local run time strictly after `after` (tz-aware, in the market's zone)."""
+    tz = after.tzinfo
+    if cadence.get("at"):
+        times = sorted(_hhmm(t) for t in cadence["at"])
+        for day in (after.date(), after.date() + timedelta(days=1)):
+            for t in times:
+                cand = _at(day, t, tz)
+                if cand > after:
+                    return cand
+    start, end = (_hhmm(x) for x in (cadence.get("between") or ("00:00", "23:59")))
+    cand = after + timedelta(minutes=int(cadence.get("every_minutes", 1440)))
+    if cand < _at(cand.date(), start, tz):
+        return _at(cand.date(), start, tz)
+    if cand > _at(cand.date(), end, tz):
+        return _at(cand.date() + timedelta(days=1), start, tz)
+    return cand
+
+def _in_window(cadence: Dict[str, Any], now: datetime) -> bool:
+    if cadence.get("at"):
+        return True
+    start, end = (_hhmm(x) for x in (cadence.get("between") or ("00:00", "23:59")))
+    return start <= now.time() <= end
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+class Scheduler:
+    def __init__(self, workers: Optional[int] = None, data_path: Path = run_jobs.DATA,
+                 fetch=None, run_on_start: bool = True):
+        self.data_path = data_path
+        self.fetch = fetch
+        self.run_on_start = run_on_start
+        self._workers_override = workers
+        self._lock = threading.Lock()        # guards payload, due times, in-flight set
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._cfg_mtimes: Tuple[Optional[int], Optional[int]] = (None, None)
+        self._bad_mtimes: Optional[Tuple[Optional[int], Optional[int]]] = None
+        self._workers = 0
+        self.markets: Dict[str, Dict[str, Any]] = {}
+        self.cadences: Dict[str, Dict[str, Any]] = dict(DEFAULT_CADENCES)
+        self.due: Dict[Job, datetime] = {}
+        self.inflight: set[Job] = set()
+        self.pool: Optional[ThreadPoolExecutor] = None
+        self.state_path = data_path.with_name("schedule_state.json")
+        self.last_run: Dict[Job, datetime] = self._load_state()
+        self._data_mtime = _mtime(data_path)
+        self.payload = self._load_snapshot()
+
+    # ----------------- config / state -----------------
+    def _load_snapshot(self) -> Dict[str, Any]:
+        payload = run_jobs.load_payload(self.data_path)
+        payload.setdefault("rates_by_day", {})
+        payload.setdefault("checkin_dates", {})
+        return payload
+
+    def _load_state(self) -> Dict[Job, datetime]:
+        try:
+            d = json.loads(self.state_path.read_text(encoding="utf-8"))
+            return {tuple(k.split("|", 1)): datetime.fromisoformat(v) for k, v in (d.get("last_run") or {}).items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_state(self) -> None:
+        # caller holds self._lock
+        body = {"last_run": {f"{m}|{l}": t.isoformat() for (m, l), t in self.last_run.items()}}
+        tmp = self.state_path.with_suffix(".json.tmp")
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(body, indent=2), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+    def _first_due(self, job: Job, cad: Dict[str, Any], now: datetime, tz) -> datetime:
+        """When a job not yet in self.due should run: now only if it's overdue since its last run."""
+        local = now.astimezone(tz)
+        upcoming = next_due(cad, local).astimezone(timezone.utc)
+        if not self.run_on_start:
+            return upcoming
+        last = self.last_run.get(job)
+        if last is None:
+            # never ran: interval labels start now (inside their window); fixed `at` times wait for their slot
+            return now if not cad.get("at") and _in_window(cad, local) else upcoming
+        due = next_due(cad, last.astimezone(tz)).astimezone(timezone.utc)
+        if due > now:
+            return due
+        return now if _in_window(cad, local) else upcoming  # missed while down: catch up, but not at 2am
+
+    def _parse_config(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]], int]:
+        """Everything that can fail (YAML, timezones, cadence syntax) happens here, before any state changes."""
+        markets: Dict[str, Dict[str, Any]] = {}
+        for h in run_jobs._load_hotels():
+            m = markets.setdefault(h["city"], {"tz": ZoneInfo(h["timezone"]), "hotels": []})
+            m["hotels"].append(h)
+        rules = (yaml.safe_load(RULES.read_text(encoding="utf-8")) if RULES.exists() else {}) or {}
+        sched = rules.get("schedule") or {}
+        cadences = sched.get("cadences") or dict(DEFAULT_CADENCES)
+        probe = datetime.now(timezone.utc)
+        for cad in cadences.values():
+            next_due(cad, probe)
+            _in_window(cad, probe)
+        workers = self._workers_override or int(sched.get("workers", 4))
+        if workers < 1:
+            raise ValueError(f"schedule.workers must be >= 1, got {workers}")
+        return markets, cadences, workers
+
+    def reload_config(self) -> bool:
+        mtimes = (_mtime(run_jobs.CONFIG), _mtime(RULES))
+        if mtimes == self._cfg_mtimes or mtimes == self._bad_mtimes:
+            return False
+        try:
+            markets, cadences, workers = self._parse_config()
+        except Exception as e:  # a typo in the YAML must not take the daemon down
+            self._bad_mtimes = mtimes
+            kept = "keeping previous config" if self.markets else "nothing scheduled until it's fixed"
+            print(f"[SCHED] config reload failed ({type(e).__name__}: {e}); {kept}")
+            return False
+        self._cfg_mtimes, self._bad_mtimes = mtimes, None
+
+        with self._lock:
+            self.markets = markets
+            self.cadences = cadences
+            if workers != self._workers:
+                old, self._workers = self.pool, workers
+                self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sched")
+                if old is not None:
+                    old.shutdown(wait=False)  # running jobs finish on the old pool
+            # drop jobs for removed markets/labels; schedule new ones
+            self.due = {j: t for j, t in self.due.items() if j[0] in markets and j[1] in self.cadences}
+            now = datetime.now(timezone.utc)
+            for market, m in markets.items():
+                for label, cad in self.cadences.items():
+                    if (market, label) not in self.due:
+                        self.due[(market, label)] = self._first_due((market, label), cad, now, m["tz"])
+        print(f"[SCHED] config loaded: {len(markets)} market(s), labels {', '.join(self.cadences)}, {workers} worker(s)")
+        return True
+
+    # ----------------- running -----------------
+    def tick(self, now: Optional[datetime] = None) -> int:
+        """Submit every due job that isn't already running. Returns how many were submitted."""
+        now = now or datetime.now(timezone.utc)
+        submitted = 0
+        with self._lock:
+            for job, when in sorted(self.due.items(), key=lambda kv: kv[1]):
+                if when > now or job in self.inflight:
+                    continue
+                self.inflight.add(job)
+                self.pool.submit(self._run_job, job)
+                submitted += 1
+        return submitted
+
+    def _run_job(self, job: Job) -> None:
+        market, label = job
+        try:
+            m = self.markets[market]
+            local_today = datetime.now(m["tz"]).date()
+            checkin = run_jobs._label_dates(local_today)[label]
+            day = run_jobs.fetch_day(checkin, m["hotels"], self.fetch)
+            self._merge(job, checkin, day)
+            print(f"[SCHED] {market}/{label} ({checkin}) refreshed")
+        except Exception as e:  # a bad run must not kill the daemon
+            print(f"[SCHED] {market}/{label} failed: {type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self.inflight.discard(job)
+                if market in self.markets and label in self.cadences:
+                    local = datetime.now(timezone.utc).astimezone(self.markets[market]["tz"])
+                    self.due[job] = next_due(self.cadences[label], local).astimezone(timezone.utc)
+            self._wake.set()
+
+    def _merge(self, job: Job, checkin, day: Dict[str, Any]) -> None:
+        market, label = job
+        now = datetime.now(timezone.utc)
+        # dates are kept per market: "Today" differs across timezones
+        partial = {
+            "generated_at": now.isoformat().replace("+00:00", "Z"),
+            "checkin_dates_by_market": {market: {label: checkin.isoformat()}},
+            "rates_by_day": {label: day},
+        }
+        partial["checkin_dates"] = run_jobs._home_dates(partial["checkin_dates_by_market"])
+        with self._lock:
+            if _mtime(self.data_path) != self._data_mtime:
+                disk = run_jobs.load_payload(self.data_path)  # someone else wrote cells; keep them
+                if disk:
+                    self.payload = disk
+            run_jobs.merge_into(self.payload, partial)
+            run_jobs.write_payload(self.payload, self.data_path)
+            self._data_mtime = _mtime(self.data_path)
+            run_jobs.append_history(partial)
+            self.last_run[job] = now
+            self._save_state()
+
+    def run_forever(self) -> None:
+        self.reload_config()
+        while not self._stop.is_set():
+            self.reload_config()
+            self.tick()
+            with self._lock:
+                pending = [t for j, t in self.due.items() if j not in self.inflight]
+            wait_s = IDLE_MAX_S
+            if pending:
+                wait_s = min(wait_s, max(0.0, (min(pending) - datetime.now(timezone.utc)).total_seconds()))
+            self._wake.wait(wait_s)
+            self._wake.clear()
+        if self.pool:
+            self.pool.shutdown(wait=True)
+
+    def run_once(self) -> None:
+        """Fire whatever is due now, wait for it, exit (for cron fallbacks and smoke tests)."""
+        self.reload_config()
+        self.tick()
+        if self.pool:
+            self.pool.shutdown(wait=True)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
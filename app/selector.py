@@ -1,7 +1,10 @@
 import re
 import statistics
+from datetime import date
 from typing import List, Dict, Any, Optional, Tuple
 
+from app.baselines import sane
+
 # -------- Normalizers / detectors --------
 def _norm(t: str) -> str:
     return re.sub(r"[^a-z0-9]+", " ", (t or "").lower()).strip()
@@ -38,7 +41,7 @@ def is_refundable(text: str) -> Optional[bool]:
     return None  # unknown
 
 def nightly_ok(v: Optional[int]) -> bool:
-    return v is not None and 40 <= v <= 600
+    return sane(v)
 
 # -------- Core selection logic --------
 def summarize_prices(prices: List[int]) -> Optional[Dict[str, int]]:
@@ -126,9 +129,12 @@ def choose_primary(offers: List[Dict[str, Any]], your_brand_group: str) -> Optio
 
     return None
 
-def sift_offers(offers: List[Dict[str, Any]], brand_hint: str) -> Dict[str, Any]:
+def sift_offers(offers: List[Dict[str, Any]], brand_hint: str,
+                hotel: Optional[str] = None, checkin: Optional[date] = None,
+                baselines=None) -> Dict[str, Any]:
     """
     Main entry:
+      - drops outliers vs the hotel's rolling baseline (when hotel/checkin/baselines given)
       - normalizes refundable/member if missing
       - selects primary via policy above
       - builds ranges by category
@@ -145,6 +151,11 @@ def sift_offers(offers: List[Dict[str, Any]], brand_hint: str) -> Dict[str, Any]
             o2["refundable"] = is_refundable(ctx)
         fixed.append(o2)
 
+    outliers: List[Dict[str, Any]] = []
+    if baselines is not None and hotel and checkin:
+        fixed = [o for o in fixed if nightly_ok(o.get("price"))]
+        fixed, outliers = baselines.screen(hotel, checkin, fixed)
+
     buckets = bucket_offers(fixed)
     ranges = {}
     for k, items in buckets.items():
@@ -161,6 +172,11 @@ def sift_offers(offers: List[Dict[str, Any]], brand_hint: str) -> Dict[str, Any]
     debug = {}
     if primary:
         debug = {"provider_ctx": primary.get("provider_ctx"), "picked_from": primary.get("source")}
+    if outliers:
+        debug["outliers"] = sorted(o["price"] for o in outliers)
+    suspects = sorted(o["price"] for o in fixed if o.get("suspect"))
+    if suspects:
+        debug["suspect"] = suspects
 
     return {
         "primary": {k: primary[k] for k in ("price","category","basis","source") } if primary else None,
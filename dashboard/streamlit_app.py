@@ -3,6 +3,7 @@ import pandas as pd
 from datetime import timedelta, datetime
 from pathlib import Path
 import json
+import os
 import pytz
 
 st.set_page_config(page_title="Beckley Hotel Rate Tracker", page_icon="📝")
@@ -13,6 +14,8 @@ APP_DIR = Path(__file__).resolve().parent
 REPO_ROOT = APP_DIR.parent
 DATA_PATH = (REPO_ROOT / "data" / "beckley_rates.json").resolve()
 YOUR_HOTEL = "Comfort Inn Beckley"
+RATES_API_URL = os.getenv("RATES_API_URL", "").rstrip("/")  # e.g. http://127.0.0.1:8502 (python -m app serve)
+MARKET = "Beckley"
 
 eastern = pytz.timezone("US/Eastern")
 today = datetime.now(eastern).date()
@@ -48,13 +51,40 @@ def load_payload(path_str: str, fingerprint: str) -> dict:
         st.error(f"⚠️ Failed to parse {path.name}: {e}")
         return {}
 
-payload = load_payload(str(DATA_PATH), _file_fingerprint(DATA_PATH))
-rates_by_day = payload.get("rates_by_day", {})
-generated_at = payload.get("generated_at")
-if rates_by_day: st.success(f"✅ Loaded local rates ({DATA_PATH.relative_to(REPO_ROOT)})")
-if generated_at: st.caption(f"Data generated at: {generated_at}")
+@st.cache_resource(show_spinner=False)
+def _api_etags() -> dict:
+    # url -> (etag, parsed body), shared across sessions so a 304 skips parsing entirely
+    return {}
 
-data_for_day = rates_by_day.get(selected_label, {})
+def load_day_from_api(base: str, label: str) -> dict | None:
+    import httpx
+    url = f"{base}/grid?market={MARKET}&label={label}"
+    cache = _api_etags()
+    etag, body = cache.get(url, (None, None))
+    try:
+        r = httpx.get(url, headers={"If-None-Match": etag} if etag else {}, timeout=5)
+        if r.status_code == 304 and body is not None:
+            return body
+        r.raise_for_status()
+        body = r.json()
+    except Exception as e:
+        st.warning(f"⚠️ Rates API unavailable ({e}); falling back to {DATA_PATH.name}")
+        return None
+    cache[url] = (r.headers.get("ETag"), body)
+    return body
+
+grid = load_day_from_api(RATES_API_URL, selected_label) if RATES_API_URL else None
+if grid is not None:
+    data_for_day = grid.get("rates", {})
+    generated_at = grid.get("generated_at")
+    if data_for_day: st.success(f"✅ Loaded rates from {RATES_API_URL}")
+else:
+    payload = load_payload(str(DATA_PATH), _file_fingerprint(DATA_PATH))
+    rates_by_day = payload.get("rates_by_day", {})
+    generated_at = payload.get("generated_at")
+    if rates_by_day: st.success(f"✅ Loaded local rates ({DATA_PATH.relative_to(REPO_ROOT)})")
+    data_for_day = rates_by_day.get(selected_label, {})
+if generated_at: st.caption(f"Data generated at: {generated_at}")
 
 hotels = [
     "Courtyard Beckley",
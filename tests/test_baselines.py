@@ -0,0 +1,149 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from app import baselines as bl
+from app.baselines import Baselines, _key
+
+HOTEL = "Hampton Inn Beckley"
+FRI = date(2026, 10, 23)
+
+
+def friday(week):
+    return FRI + timedelta(weeks=week)
+
+
+def offer(price, ctx="Hampton by Hilton"):
+    return {"price": price, "provider_ctx": ctx}
+
+
+@pytest.fixture
+def b(tmp_path):
+    return Baselines(tmp_path / "baselines.json")
+
+
+def seed(b, nights=bl.MIN_OBS, brand=100, expedia=98, start=0):
+    for week in range(start, start + nights):
+        b.screen(HOTEL, friday(week), [offer(brand), offer(expedia, "Expedia")])
+    return start + nights  # next unused week
+
+
+def test_one_response_is_one_night(b):
+    b.screen(HOTEL, FRI, [offer(100 + i) for i in range(8)])
+    n, m, _, _ = b.stats[_key(HOTEL, FRI, "brand_hilton")]
+    assert n == 1
+    assert m == pytest.approx(103.5)  # group median, not the first offer
+    assert b.zscore(_key(HOTEL, FRI, "brand_hilton"), 500) is None
+
+
+def test_refreshes_of_the_same_night_learn_once(b):
+    for _ in range(3):  # scheduler refreshes, or addr + city both parsing
+        b.screen(HOTEL, FRI, [offer(100)])
+    assert b.stats[_key(HOTEL, FRI, "brand_hilton")][0] == 1
+
+
+def test_interleaved_labels_do_not_repeat(b):
+    key = _key(HOTEL, FRI, "brand_hilton")
+    for d in (friday(1), friday(0), friday(1), friday(0)):  # Friday label, then Today/Tomorrow
+        b.screen(HOTEL, d, [offer(100)])
+    assert b.stats[key][0] == 2
+
+
+def test_min_obs_counts_nights(b):
+    week = seed(b, nights=bl.MIN_OBS - 1)
+    key = _key(HOTEL, FRI, "brand_hilton")
+    assert b.zscore(key, 500) is None
+    seed(b, nights=1, start=week)
+    assert b.stats[key][0] == bl.MIN_OBS
+    assert b.zscore(key, 500) > bl.Z_MAX
+
+
+def test_estimator_converges_and_keeps_mad_floor(b):
+    key = "k"
+    for _ in range(60):
+        b.update(key, 150)
+    n, m, d, _ = b.stats[key]
+    assert n == 60
+    assert m == pytest.approx(150)
+    assert d == pytest.approx(bl.MIN_MAD_FRAC * 150)
+
+    for _ in range(60):
+        b.update(key, 180)
+    assert b.stats[key][1] == pytest.approx(180, abs=5)
+
+
+def test_ordinary_price_moves_are_kept(b):
+    week = seed(b, nights=20)
+    kept, outliers = b.screen(HOTEL, friday(week), [offer(130), offer(128, "Expedia")])
+    assert [o["price"] for o in kept] == [130, 128]
+    assert outliers == []
+
+
+def test_bad_parse_is_dropped(b):
+    week = seed(b, nights=20)
+    offers = [offer(101), offer(45), offer(99, "Expedia"), offer(100, "Booking.com")]
+    kept, outliers = b.screen(HOTEL, friday(week), offers)
+    assert [o["price"] for o in outliers] == [45]
+    assert [o["price"] for o in kept] == [101, 99, 100]
+    assert not any(o.get("suspect") for o in kept)
+
+
+def test_event_night_is_kept(b):
+    week = seed(b, nights=20)
+    offers = [offer(310), offer(295, "Expedia"), offer(320, "Booking.com")]
+    kept, outliers = b.screen(HOTEL, friday(week), offers)
+    assert len(kept) == 3 and outliers == []
+
+
+def test_large_move_is_flagged_not_emptied_then_recentres(b):
+    week = seed(b, nights=20)
+    key = _key(HOTEL, FRI, "brand_hilton")
+    for week in range(week, week + bl.RECENTER_AFTER):
+        kept, outliers = b.screen(HOTEL, friday(week), [offer(260)])
+        assert outliers == []
+        assert [o["price"] for o in kept] == [260]
+        assert kept[0]["suspect"] is True
+        if b.stats[key][3]:
+            # a same-night refresh is screened (still flagged) but doesn't count toward re-centring
+            assert b.screen(HOTEL, friday(week), [offer(260)])[0][0]["suspect"] is True
+            assert b.stats[key][1] == pytest.approx(100, abs=3)
+    assert b.stats[key][1] == pytest.approx(260)
+    assert b.stats[key][3] == 0
+
+    kept, outliers = b.screen(HOTEL, friday(week + 1), [offer(255)])
+    assert outliers == [] and "suspect" not in kept[0]
+
+
+def test_clean_night_resets_rejections(b):
+    week = seed(b, nights=20)
+    key = _key(HOTEL, FRI, "brand_hilton")
+    b.screen(HOTEL, friday(week), [offer(260)])
+    assert b.stats[key][3] == 1
+    b.screen(HOTEL, friday(week + 1), [offer(100)])
+    assert b.stats[key][3] == 0
+
+
+def test_learn_false_leaves_baselines_alone(b):
+    seed(b)
+    before = json.dumps([b.stats, b.seen])
+    b.screen(HOTEL, friday(30), [offer(100), offer(260)], learn=False)
+    assert json.dumps([b.stats, b.seen]) == before
+
+
+def test_save_load_round_trip(b):
+    seed(b)
+    b.save()
+    again = Baselines(b.path)
+    key = _key(HOTEL, FRI, "brand_hilton")
+    assert again.stats[key][0] == b.stats[key][0]
+    assert again.stats[key][1] == pytest.approx(b.stats[key][1], abs=0.01)
+    assert again.seen == b.seen
+    assert not b.path.with_suffix(".json.tmp").exists()
+    assert again.first_time(key, friday(bl.MIN_OBS - 1)) is False
+
+
+def test_loads_v1_files(tmp_path):
+    path = tmp_path / "baselines.json"
+    path.write_text(json.dumps({"v": 1, "stats": {"k": [12, 110.0, 9.5]}}), encoding="utf-8")
+    assert Baselines(path).stats["k"] == [12.0, 110.0, 9.5, 0.0]
@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from app.baselines import Baselines
+from app.fetchers import hedging
+from app.fetchers import serpapi_google as sg
+from app.fetchers.hedging import HedgeStats
+
+HOTEL = "Hampton Inn Beckley"
+ADDRESS = "1 Hampton Dr, Beckley, WV"
+CITY = "Beckley"
+CHECKIN = date(2026, 10, 23)
+
+FOUND = {"properties": [{"name": HOTEL, "address": "Beckley, WV", "rate_per_night": {"extracted_lowest": 120}}]}
+EMPTY = {"properties": []}
+
+
+class _Response:
+    def __init__(self, body):
+        self.text = json.dumps(body)
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+
+class StubClient:
+    """Answers addr/city queries after a per-tag delay; records when each call started and ended."""
+
+    def __init__(self, plan):
+        self.plan = plan  # tag -> (delay_s, body)
+        self.calls = []   # (tag, started, ended)
+        self.idle = threading.Event()
+        self.idle.set()
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, params, timeout):
+        tag = "city" if params["q"] == f"{HOTEL}, {CITY}" else "addr"
+        with self._lock:
+            self._open += 1
+            self.idle.clear()
+        started = time.perf_counter()
+        delay, body = self.plan[tag]
+        time.sleep(delay)
+        with self._lock:
+            self.calls.append((tag, started, time.perf_counter()))
+            self._open -= 1
+            if not self._open:
+                self.idle.set()
+        return _Response(body)
+
+    def tags(self):
+        return sorted(t for t, _, _ in self.calls)
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    monkeypatch.setattr(sg, "SERPAPI_KEY", "test")
+    monkeypatch.setattr(sg, "RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr(sg, "_BASELINES", Baselines(tmp_path / "baselines.json"))
+    monkeypatch.setattr(hedging, "DEFAULT_DELAY_S", 0.05)
+
+    def setup(plan, budget=25, streak=0):
+        stats = HedgeStats(tmp_path / "hedge_stats.json", daily_budget=budget)
+        if streak:
+            stats.city_streak[HOTEL] = streak
+        client = StubClient(plan)
+        monkeypatch.setattr(sg, "_HEDGE", stats)
+        monkeypatch.setattr(sg, "_client", lambda: client)
+        return stats, client
+
+    return setup
+
+
+def fetch():
+    return sg.fetch_brand_categorized_for_hotel(HOTEL, ADDRESS, CITY, CHECKIN, hedge=True)
+
+
+def raw_files(tag):
+    return list(sg.RAW_DIR.glob(f"*_{tag}_ok_*.json"))
+
+
+def test_slow_addr_loses_to_city_and_is_dropped(env):
+    stats, client = env({"addr": (0.4, FOUND), "city": (0.0, FOUND)}, streak=1)
+    res = fetch()
+    assert "_city_ok_" in res["debug"]["raw_file"]
+    client.idle.wait(2)
+    assert client.tags() == ["addr", "city"]
+    assert stats.budget_used == 1
+    assert raw_files("addr") == []  # answered after city won, never parsed or saved
+    assert stats.city_streak[HOTEL] == 1  # cancelled addr teaches nothing either way
+
+
+def test_empty_addr_runs_city_after_it(env):
+    stats, client = env({"addr": (0.0, EMPTY), "city": (0.0, FOUND)})
+    res = fetch()
+    assert "_city_ok_" in res["debug"]["raw_file"]
+    (addr, _, addr_end), (city, city_start, _) = client.calls
+    assert (addr, city) == ("addr", "city") and city_start >= addr_end
+    assert stats.budget_used == 0  # sequential fallback isn't speculative
+    assert stats.city_streak[HOTEL] == 1
+
+
+def test_no_budget_no_speculative_launch(env):
+    stats, client = env({"addr": (0.2, FOUND), "city": (0.0, FOUND)}, budget=0)
+    res = fetch()
+    assert "_addr_ok_" in res["debug"]["raw_file"]
+    assert client.tags() == ["addr"]
+    assert HOTEL not in stats.city_streak
+
+
+def test_city_only_hotel_without_budget_waits_for_addr(env):
+    stats, client = env({"addr": (0.1, EMPTY), "city": (0.0, FOUND)}, budget=0, streak=hedging.CITY_STREAK)
+    res = fetch()
+    assert "_city_ok_" in res["debug"]["raw_file"]
+    (addr, _, addr_end), (city, city_start, _) = client.calls
+    assert (addr, city) == ("addr", "city") and city_start >= addr_end
+    assert stats.budget_used == 0
+    assert stats.city_streak[HOTEL] == hedging.CITY_STREAK + 1
+
+
+def test_city_only_hotel_launches_both_and_pays_for_it(env):
+    stats, client = env({"addr": (0.3, EMPTY), "city": (0.0, FOUND)}, streak=hedging.CITY_STREAK)
+    res = fetch()
+    assert "_city_ok_" in res["debug"]["raw_file"]
+    assert stats.budget_used == 1
+    client.idle.wait(2)
+    assert stats.city_streak[HOTEL] == hedging.CITY_STREAK  # city won before addr answered
+
+
+def test_stats_save_is_atomic(tmp_path):
+    stats = HedgeStats(tmp_path / "hedge_stats.json")
+    stats.record_latency(1.25)
+    stats.take_budget()
+    stats.save()
+    again = HedgeStats(tmp_path / "hedge_stats.json")
+    assert list(again.latencies) == [1.25] and again.budget_used == 1
+    assert [p.name for p in tmp_path.iterdir()] == ["hedge_stats.json"]